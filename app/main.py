@@ -1,16 +1,32 @@
 # main.py
 import os
+
+# Limiter les threads BLAS avant tout import numpy / torch (via kokoro)
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+os.environ.setdefault("MKL_NUM_THREADS", "1")
+
 import time  # <-- AJOUTÉ
+import hashlib
+import itertools
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+import re
+import secrets
+import stat
+import struct
+import threading
+from collections import OrderedDict
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
 from typing import Optional
 
+import numpy as np
 import soundfile as sf
 import asyncio
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse
+from anyio import CapacityLimiter, to_thread as anyio_to_thread
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import FileResponse, JSONResponse, ORJSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from fastapi.middleware.cors import CORSMiddleware  # <-- AJOUTÉ
 
@@ -21,17 +37,68 @@ except Exception as e:
     # On laisse pipeline = None pour pouvoir donner une erreur claire plus bas
     KPipeline = None
 
+# torch (installé avec kokoro) : configuré plus bas, une fois le logging en place
+try:
+    import torch
+except Exception:
+    # même tolérance que pour kokoro (ex: OSError si CUDA / libs partagées cassées)
+    torch = None
+
+# orjson (optionnel): sérialisation JSON plus rapide des réponses
+try:
+    import orjson  # noqa: F401
+    DefaultResponse = ORJSONResponse
+except Exception:
+    DefaultResponse = JSONResponse
+
+# Numba (optionnel): accélère la conversion float -> int16
+try:
+    from numba import njit
+except Exception:
+    njit = None
+
 APP_ROOT = Path(__file__).parent
 STATIC_DIR = APP_ROOT / "static"
 STATIC_DIR.mkdir(exist_ok=True)
 
+# Identifiants des fichiers générés: uniques et croissants, sans appel horloge par requête.
+# Le suffixe propre au processus évite les collisions entre workers uvicorn démarrés en même temps
+_COUNTER = itertools.count(int(time.time() * 1000))
+_PROC_TAG = secrets.token_hex(3)
+
+# Noms acceptés par /download (voir safe_filename)
+_SAFE_RE = re.compile(r"kokoro_\d{10,16}_[0-9a-f]{6}\.wav")  # utilisé avec fullmatch
+
 # ---------- Configuration ----------
 MAX_TEXT_LENGTH = 3000
 AUDIO_SR = 24000
 DEFAULT_VOICE = "af_heart"
 DEFAULT_LANG = "f"
 PIPELINE_TIMEOUT = 60
+QUEUE_TIMEOUT = 60  # attente max (s) d'une place libre dans le limiteur d'inférence
+# Codes langue acceptés par KPipeline (et alias usuels -> code Kokoro)
+KOKORO_LANGS = {"a", "b", "e", "f", "h", "i", "j", "p", "z"}
+LANG_ALIASES = {
+    "en-us": "a", "en-gb": "b", "es": "e", "fr-fr": "f", "hi": "h",
+    "it": "i", "ja": "j", "pt-br": "p", "zh": "z",
+}
 FILE_CLEANUP_DELAY = 300  # <-- AJOUTÉ : Délai en secondes avant suppression (ex: 5 minutes)
+TTS_MAX_CONCURRENCY = int(os.getenv("TTS_MAX_CONCURRENCY", "1"))  # inférences simultanées max
+
+# Threads dédiés à l'inférence, séparés du pool partagé de FastAPI/Starlette.
+# Limite aussi la concurrence: plusieurs forwards en parallèle se disputent les cœurs CPU.
+# Créé au premier usage (voir get_tts_limiter): certaines versions d'anyio exigent une boucle active
+TTS_LIMITER: Optional[CapacityLimiter] = None
+
+# Pool de buffers int16 réutilisés pour l'écriture des WAV (clips <= 30 s)
+BUFPOOL: "queue.LifoQueue[np.ndarray]" = queue.LifoQueue()
+STANDARD_LEN = AUDIO_SR * 30
+
+# Cache LRU des synthèses: clé (text, voice, lang, speed) -> nom du fichier WAV
+CACHE: "OrderedDict[str, str]" = OrderedDict()
+CACHE_MAX = 128
+CACHED_FILES: set[str] = set()  # fichiers à ne pas supprimer après téléchargement
+CACHE_LOCK = asyncio.Lock()
 
 # ---------- Logging ----------
 logger = logging.getLogger("tts_api")
@@ -41,15 +108,31 @@ fmt = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
 # file handler with rotation
 fh = RotatingFileHandler("tts_api.log", maxBytes=5_000_000, backupCount=3)
 fh.setFormatter(fmt)
-logger.addHandler(fh)
 
 # console handler
 ch = logging.StreamHandler()
 ch.setFormatter(fmt)
-logger.addHandler(ch)
+
+# les requêtes ne font qu'empiler les records; l'écriture (fichier, console)
+# se fait dans le thread du listener (démarré avec l'app, voir _start_log_listener)
+log_queue = queue.SimpleQueue()
+logger.addHandler(QueueHandler(log_queue))
+log_listener: Optional[QueueListener] = None
+
+# ---------- Threads torch ----------
+# un pool intra-op raisonnable, pas de parallélisme inter-op
+if torch is not None:
+    # une valeur invalide de TTS_TORCH_THREADS lève une erreur au démarrage
+    TTS_TORCH_THREADS = int(os.getenv("TTS_TORCH_THREADS", str(max(1, (os.cpu_count() or 1) // 2))))
+    torch.set_num_threads(TTS_TORCH_THREADS)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError as e:
+        # déjà fixé (travail parallèle démarré avant nous)
+        logger.warning("Impossible de fixer les threads inter-op torch: %s", e)
 
 # ---------- FastAPI app ----------
-app = FastAPI(title="Simple TTS API (Kokoro)")
+app = FastAPI(title="Simple TTS API (Kokoro)", default_response_class=DefaultResponse)
 
 # ---------- AJOUT MIDDLEWARE CORS ----------
 # Permet à ton app React (sur un autre port) d'appeler cette API
@@ -63,6 +146,108 @@ app.add_middleware(
 )
 # ----------------------------------------
 
+@app.on_event("startup")
+def _start_log_listener():
+    """Démarre l'écriture des logs (un listener neuf à chaque démarrage de l'app)."""
+    global log_listener
+    if log_listener is None:
+        log_listener = QueueListener(log_queue, fh, ch, respect_handler_level=True)
+        log_listener.start()
+
+@app.on_event("shutdown")
+def _stop_log_listener():
+    """Vide la file de logs avant l'arrêt (sans effet si déjà arrêté)."""
+    global log_listener
+    if log_listener is not None:
+        log_listener.stop()
+        log_listener = None
+
+def get_tts_limiter() -> CapacityLimiter:
+    """Retourne le limiteur d'inférence, créé au premier appel (depuis la boucle)."""
+    global TTS_LIMITER
+    if TTS_LIMITER is None:
+        TTS_LIMITER = CapacityLimiter(TTS_MAX_CONCURRENCY)
+    return TTS_LIMITER
+
+_TTS_TASKS: set[asyncio.Task] = set()
+
+async def start_tts_thread(func, *args) -> asyncio.Task:
+    """Lance func(*args) dans un thread du limiteur d'inférence et attend son démarrage.
+
+    L'attente d'une place est bornée par QUEUE_TIMEOUT (asyncio.TimeoutError, func n'est
+    alors jamais exécutée). Retourne la tâche qui se termine avec le résultat de func: elle
+    garde sa place dans le limiteur jusqu'à la fin du thread, même si l'appelant abandonne.
+    """
+    loop = asyncio.get_running_loop()
+    started = asyncio.Event()
+    state_lock = threading.Lock()
+    state = {"running": False, "abandoned": False}
+
+    def run():
+        with state_lock:
+            if state["abandoned"]:
+                return None
+            state["running"] = True
+        loop.call_soon_threadsafe(started.set)
+        return func(*args)
+
+    task = asyncio.create_task(anyio_to_thread.run_sync(run, limiter=get_tts_limiter()))
+    # référence forte tant que le thread tourne (la boucle ne garde qu'une référence faible)
+    _TTS_TASKS.add(task)
+    task.add_done_callback(_TTS_TASKS.discard)
+    # le résultat peut ne jamais être lu (appelant parti): évite "exception never retrieved"
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    try:
+        await asyncio.wait_for(started.wait(), timeout=QUEUE_TIMEOUT)
+    except BaseException as e:
+        with state_lock:
+            running = state["running"]
+            state["abandoned"] = not running
+        if not running:
+            task.cancel()
+            raise
+        # thread démarré de justesse: seul un timeout est ignoré
+        if not isinstance(e, asyncio.TimeoutError):
+            raise
+    return task
+
+# ---------- Cache des pipelines Kokoro ----------
+# Un KPipeline par langue, créé une seule fois (le chargement du modèle est coûteux)
+PIPELINES: dict[str, "KPipeline"] = {}
+_PIPELINE_LOCKS: dict[str, asyncio.Lock] = {}
+
+async def get_pipeline(lang: str):
+    """Retourne le KPipeline de la langue demandée, en le créant au premier appel."""
+    pipeline = PIPELINES.get(lang)
+    if pipeline is not None:
+        return pipeline
+    # langues limitées par validate_request: un verrou par code, gardé une fois créé
+    lock = _PIPELINE_LOCKS.get(lang)
+    if lock is None:
+        lock = _PIPELINE_LOCKS[lang] = asyncio.Lock()
+    async with lock:
+        # une autre requête a pu l'initialiser pendant qu'on attendait le verrou
+        pipeline = PIPELINES.get(lang)
+        if pipeline is None:
+            logger.info("Initialisation KPipeline (lang=%s)", lang)
+            pipeline = await asyncio.to_thread(KPipeline, lang_code=lang)
+            PIPELINES[lang] = pipeline
+    return pipeline
+
+@app.on_event("startup")
+async def _warm():
+    """Charge le pipeline de la langue par défaut au démarrage."""
+    if f32_to_i16 is not None:
+        # compilation JIT une fois pour toutes, pas sur la première requête
+        await asyncio.to_thread(to_pcm16, np.zeros(16, dtype=np.float32))
+    if KPipeline is None:
+        logger.warning("KPipeline (kokoro) non disponible: pas de préchargement")
+        return
+    try:
+        await get_pipeline(DEFAULT_LANG)
+    except Exception as e:
+        logger.exception("Erreur préchargement KPipeline: %s", e)
+
 # ---------- Pydantic models ----------
 class TTSRequest(BaseModel):
     text: str = Field(..., example="Bonjour tout le monde")
@@ -76,12 +261,59 @@ class APIResponse(BaseModel):
     data: Optional[dict] = None
 
 # ---------- Helpers ----------
-def write_wav_file(filename: Path, audio_numpy, samplerate: int = AUDIO_SR):
-    """Écrit un fichier WAV en utilisant soundfile"""
-    sf.write(str(filename), audio_numpy, samplerate)
+if njit is not None:
+    @njit(cache=True)
+    def f32_to_i16(x, out):
+        # clip + mise à l'échelle + quantification en une seule passe
+        for i in range(x.shape[0]):
+            v = x[i]
+            v = -1.0 if v < -1.0 else (1.0 if v > 1.0 else v)
+            out[i] = np.int16(v * 32767.0)
+else:
+    f32_to_i16 = None
+
+def quantize_into(audio, out: np.ndarray):
+    """Écrit dans `out` (int16) le signal float [-1, 1], sans repliement en cas de dépassement."""
+    x = np.ascontiguousarray(audio, dtype=np.float32)
+    if f32_to_i16 is not None:
+        f32_to_i16(x, out)
+    else:
+        out[:] = np.clip(x, -1.0, 1.0) * 32767.0
+
+def to_pcm16(audio) -> np.ndarray:
+    """Convertit un signal float [-1, 1] en nouveau tableau int16."""
+    out = np.empty(np.shape(audio)[0], dtype=np.int16)
+    quantize_into(audio, out)
+    return out
+
+def write_wav_file(filename: Path, pcm16, samplerate: int = AUDIO_SR):
+    """Écrit un fichier WAV PCM 16 bits (échantillons int16) en utilisant soundfile"""
+    sf.write(str(filename), pcm16, samplerate, subtype="PCM_16")
+
+def write_chunks_wav(filename: Path, chunks, samplerate: int = AUDIO_SR):
+    """Quantifie les chunks directement dans un buffer int16 du pool puis écrit le WAV."""
+    n = sum(c.shape[0] for c in chunks)
+    pooled = n <= STANDARD_LEN
+    if not pooled:
+        # clip trop long pour le pool: buffer dédié
+        buf = np.empty(n, dtype=np.int16)
+    else:
+        try:
+            buf = BUFPOOL.get_nowait()
+        except queue.Empty:
+            buf = np.empty(STANDARD_LEN, dtype=np.int16)
+    try:
+        pos = 0
+        for c in chunks:
+            quantize_into(c, buf[pos:pos + c.shape[0]])
+            pos += c.shape[0]
+        write_wav_file(filename, buf[:n], samplerate)
+    finally:
+        if pooled:
+            BUFPOOL.put(buf)
 
 def safe_filename(ts: int):
-    return f"kokoro_{ts}.wav"
+    return f"kokoro_{ts}_{_PROC_TAG}.wav"
 
 def cleanup_file(path: Path):
     """Supprime un fichier s'il existe."""
@@ -93,17 +325,110 @@ def cleanup_file(path: Path):
         logger.warning("Erreur suppression fichier %s : %s", path, e)
 
 # <-- AJOUTÉ : Nouvelle fonction pour la suppression différée -->
-def cleanup_file_delayed(path: Path, delay_seconds: int):
-    """Attend N secondes puis supprime le fichier."""
+def schedule_cleanup(path: Path, delay_seconds: int):
+    """Planifie la suppression du fichier dans N secondes (timer de la boucle, sans thread)."""
     logger.info("Planification suppression de %s dans %d secondes", path, delay_seconds)
-    time.sleep(delay_seconds)
-    cleanup_file(path)
+    asyncio.get_running_loop().call_later(delay_seconds, cleanup_file, path)
 # -------------------------------------------------------------
 
-# ---------- Endpoints ----------
-@app.post("/tts", response_model=APIResponse)
-async def synthesize_tts(payload: TTSRequest):
-    # 1) validations simples
+def sync_generate(pipeline, text: str, voice: str, speed: float, out_path: Path) -> str:
+    """Exécute le pipeline (bloquant) et écrit le WAV. Retourne le nom du fichier."""
+    try:
+        # pipeline retourne un générateur: for i, (gs, ps, audio) in enumerate(gen):
+        # un chunk par segment de texte, on les garde tous (et pas seulement le dernier)
+        gen = pipeline(text, voice=voice, speed=speed)
+        chunks = []
+        for i, item in enumerate(gen):
+            # item attendu: (gs, ps, audio)
+            if not item or len(item) < 3:
+                continue
+            gs, ps, audio = item
+            if audio is not None:
+                chunks.append(np.asarray(audio))
+        if not chunks:
+            logger.error("Pipeline n'a retourné aucun audio.")
+            raise RuntimeError("Aucune sortie audio produite par le modèle.")
+        # écrire le wav final
+        write_chunks_wav(out_path, chunks, AUDIO_SR)
+        logger.info("Fichier audio généré: %s", out_path)
+        return str(out_path.name)
+    except Exception as e:
+        logger.exception("Erreur pendant génération TTS: %s", e)
+        # Si fichier résiduel existant, supprimer
+        if out_path.exists():
+            try:
+                out_path.unlink()
+            except Exception:
+                pass
+        raise
+
+def cache_key(text: str, voice: str, lang: str, speed: float) -> str:
+    return hashlib.md5(f"{text}|{voice}|{lang}|{speed}".encode("utf-8")).hexdigest()
+
+async def cache_get(key: str) -> Optional[str]:
+    """Retourne le fichier en cache pour cette clé (et le marque comme récent)."""
+    async with CACHE_LOCK:
+        filename = CACHE.get(key)
+        if filename is None:
+            return None
+        CACHE.move_to_end(key)
+    # avec plusieurs workers, un /download servi par un autre processus a pu supprimer
+    # le fichier: on vérifie hors de la boucle (et sans garder le verrou)
+    if await asyncio.to_thread((STATIC_DIR / filename).is_file):
+        return filename
+    async with CACHE_LOCK:
+        if CACHE.get(key) == filename:
+            del CACHE[key]
+            CACHED_FILES.discard(filename)
+    return None
+
+async def cache_put(key: str, filename: str):
+    """Ajoute un fichier au cache; le plus ancien est supprimé au-delà de CACHE_MAX."""
+    async with CACHE_LOCK:
+        previous = CACHE.get(key)
+        if previous is not None and previous != filename:
+            # deux requêtes identiques générées en parallèle: l'ancien fichier n'est plus référencé
+            CACHED_FILES.discard(previous)
+            schedule_cleanup(STATIC_DIR / previous, FILE_CLEANUP_DELAY)
+        CACHE[key] = filename
+        CACHE.move_to_end(key)
+        CACHED_FILES.add(filename)
+        while len(CACHE) > CACHE_MAX:
+            _, old = CACHE.popitem(last=False)
+            CACHED_FILES.discard(old)
+            # suppression différée: un client peut encore être en train de le télécharger
+            schedule_cleanup(STATIC_DIR / old, FILE_CLEANUP_DELAY)
+
+def sweep_static_dir(max_age: float):
+    """Supprime les WAV générés plus vieux que max_age secondes (restes d'une exécution précédente)."""
+    limit = time.time() - max_age
+    for path in STATIC_DIR.glob("kokoro_*.wav"):
+        try:
+            if path.stat().st_mtime < limit:
+                cleanup_file(path)
+        except OSError:
+            pass
+
+@app.on_event("startup")
+async def _sweep_static():
+    # les fichiers encore en cache ou en attente de suppression à l'arrêt ne sont
+    # jamais repris: on les nettoie au démarrage (les récents peuvent appartenir à un autre worker)
+    await asyncio.to_thread(sweep_static_dir, FILE_CLEANUP_DELAY)
+
+def tts_response(filename: str) -> dict:
+    # construire URL de téléchargement (relatif)
+    download_url = f"/download/{filename}"
+    return {
+        "success": True,
+        "message": "Audio généré avec succès.",
+        "data": {
+            "filename": filename,
+            "download_url": download_url
+        }
+    }
+
+def validate_request(payload: TTSRequest):
+    """Valide la requête et retourne (text, voice, lang)."""
     text = (payload.text or "").strip()
     if not text:
         logger.warning("Requete TTS avec texte vide")
@@ -114,100 +439,170 @@ async def synthesize_tts(payload: TTSRequest):
         raise HTTPException(status_code=413, detail=f"Texte trop long (max {MAX_TEXT_LENGTH} caractères).")
 
     voice = payload.voice or DEFAULT_VOICE
-    lang = payload.lang or DEFAULT_LANG
+    lang = (payload.lang or DEFAULT_LANG).lower()
+    lang = LANG_ALIASES.get(lang, lang)
+    if lang not in KOKORO_LANGS:
+        logger.info("Langue non supportée: %r", payload.lang)
+        raise HTTPException(status_code=422, detail=f"Langue non supportée (valeurs possibles: {', '.join(sorted(KOKORO_LANGS))}).")
 
-    # 2) vérifier que Kokoro est disponible
     if KPipeline is None:
         logger.error("KPipeline (kokoro) non disponible: import failed")
         raise HTTPException(status_code=503, detail="TTS engine not available (kokoro not installed or failed to import).")
 
-    # 3) préparer fichier de sortie temporaire
-    ts = int(time.time() * 1000)
+    return text, voice, lang
+
+def wav_stream_header(samplerate: int = AUDIO_SR) -> bytes:
+    """En-tête WAV PCM 16 bits mono de longueur inconnue (tailles à 0xFFFFFFFF)."""
+    unknown = 0xFFFFFFFF
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", unknown, b"WAVE",
+        b"fmt ", 16, 1, 1, samplerate, samplerate * 2, 2, 16,
+        b"data", unknown,
+    )
+
+def pcm16_bytes(audio) -> bytes:
+    """Convertit un chunk float [-1, 1] en octets PCM 16 bits little-endian."""
+    return to_pcm16(audio).astype("<i2", copy=False).tobytes()
+
+def stream_generate(pipeline, text: str, voice: str, speed: float, push, stop: threading.Event):
+    """Exécute le pipeline (bloquant) et pousse chaque chunk audio dès qu'il est prêt."""
+    try:
+        for item in pipeline(text, voice=voice, speed=speed):
+            if stop.is_set():
+                break
+            # item attendu: (gs, ps, audio)
+            if not item or len(item) < 3:
+                continue
+            gs, ps, audio = item
+            if audio is not None:
+                push(pcm16_bytes(audio))
+    except Exception as e:
+        logger.exception("Erreur pendant génération TTS (stream): %s", e)
+    finally:
+        push(None)  # fin du flux
+
+# ---------- Endpoints ----------
+@app.post("/tts", response_model=APIResponse)
+async def synthesize_tts(payload: TTSRequest):
+    # 1) validations simples + 2) vérifier que Kokoro est disponible
+    text, voice, lang = validate_request(payload)
+
+    # 3) même requête déjà synthétisée ? on renvoie le fichier existant
+    key = cache_key(text, voice, lang, payload.speed)
+    cached = await cache_get(key)
+    if cached is not None:
+        logger.info("TTS cache hit (voice=%s, lang=%s): %s", voice, lang, cached)
+        return tts_response(cached)
+
+    # préparer fichier de sortie temporaire
+    ts = next(_COUNTER)
     out_path = STATIC_DIR / safe_filename(ts)
 
     logger.info("TTS requested (len=%d, voice=%s, lang=%s). Out: %s", len(text), voice, lang, out_path)
 
     # 4) exécuter la génération dans un thread (blocking operation)
-    async def run_pipeline_and_write():
-        try:
-            pipeline = KPipeline(lang_code=lang)
-        except Exception as e:
-            logger.exception("Erreur initialisation KPipeline: %s", e)
-            raise RuntimeError("Erreur d'initialisation du moteur TTS.") from e
+    loop = asyncio.get_running_loop()
+    try:
+        pipeline = await get_pipeline(lang)
+    except Exception as e:
+        logger.exception("Erreur initialisation KPipeline: %s", e)
+        raise HTTPException(status_code=503, detail="Erreur d'initialisation du moteur TTS.")
 
-        try:
-            # pipeline retourne un générateur: for i, (gs, ps, audio) in enumerate(gen):
-            # on l'exécute en local (bloquant) et on sauvegarde le dernier audio rendu
-            gen = pipeline(text, voice=voice, speed=payload.speed)
-            last_audio = None
-            for i, item in enumerate(gen):
-                # item attendu: (gs, ps, audio)
-                if not item or len(item) < 3:
-                    continue
-                gs, ps, audio = item
-                last_audio = audio  # numpy array
-                # si on veut, on peut streamer ici (non implémenté)
-            if last_audio is None:
-                logger.error("Pipeline n'a retourné aucun audio.")
-                raise RuntimeError("Aucune sortie audio produite par le modèle.")
-            # écrire le wav final
-            write_wav_file(out_path, last_audio, AUDIO_SR)
-            logger.info("Fichier audio généré: %s", out_path)
-            return str(out_path.name)
-        except Exception as e:
-            logger.exception("Erreur pendant génération TTS: %s", e)
-            # Si fichier résiduel existant, supprimer
-            if out_path.exists():
-                try:
-                    out_path.unlink()
-                except Exception:
-                    pass
-            raise
+    try:
+        task = await start_tts_thread(sync_generate, pipeline, text, voice, payload.speed, out_path)
+    except asyncio.TimeoutError:
+        logger.error("Aucune place d'inférence libre après %d s", QUEUE_TIMEOUT)
+        raise HTTPException(status_code=503, detail="Moteur TTS saturé, réessayez plus tard.")
 
     try:
-        # (Logique de thread/async conservée telle quelle)
-        filename = await asyncio.wait_for(asyncio.to_thread(lambda: asyncio.run(run_pipeline_and_write()) if False else asyncio.get_event_loop()), timeout=PIPELINE_TIMEOUT)
+        # PIPELINE_TIMEOUT ne compte que la génération, pas l'attente du limiteur
+        filename = await asyncio.wait_for(asyncio.shield(task), timeout=PIPELINE_TIMEOUT)
     except asyncio.TimeoutError:
         logger.error("Timeout lors de l'appel au pipeline TTS (>%d s)", PIPELINE_TIMEOUT)
+        # le thread va jusqu'au bout: son fichier ne sera jamais téléchargé
+        task.add_done_callback(lambda _: loop.run_in_executor(None, cleanup_file, out_path))
         raise HTTPException(status_code=504, detail="Génération TTS trop longue (timeout).")
     except Exception as e:
-        logger.debug("Retrying pipeline run in to_thread with proper sync wrapper due to earlier failure.")
+        logger.exception("Échec génération TTS: %s", e)
+        raise HTTPException(status_code=500, detail="Erreur interne lors de la génération TTS.")
+
+    await cache_put(key, filename)
+
+    # 5) réponse avec l'URL de téléchargement
+    return tts_response(filename)
+
+@app.post("/tts/stream")
+async def synthesize_tts_stream(payload: TTSRequest):
+    """Variante de /tts qui renvoie l'audio au fil de la génération (WAV PCM 16 bits)."""
+    text, voice, lang = validate_request(payload)
+
+    try:
+        pipeline = await get_pipeline(lang)
+    except Exception as e:
+        logger.exception("Erreur initialisation KPipeline: %s", e)
+        raise HTTPException(status_code=503, detail="Erreur d'initialisation du moteur TTS.")
+
+    logger.info("TTS stream requested (len=%d, voice=%s, lang=%s)", len(text), voice, lang)
+
+    loop = asyncio.get_running_loop()
+    chunks_q: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+
+    def push(chunk):
+        loop.call_soon_threadsafe(chunks_q.put_nowait, chunk)
+
+    # on attend que le thread démarre avant de répondre: l'attente du limiteur ne compte
+    # pas dans PIPELINE_TIMEOUT et un serveur saturé répond 503 plutôt qu'un flux vide
+    try:
+        await start_tts_thread(stream_generate, pipeline, text, voice, payload.speed, push, stop)
+    except asyncio.TimeoutError:
+        logger.error("Aucune place d'inférence libre après %d s (stream)", QUEUE_TIMEOUT)
+        raise HTTPException(status_code=503, detail="Moteur TTS saturé, réessayez plus tard.")
+
+    async def generate():
         try:
-            def sync_wrapper():
-                # run the async inner function in a new loop for this thread
-                return asyncio.new_event_loop().run_until_complete(run_pipeline_and_write())
-            filename = await asyncio.to_thread(sync_wrapper)
-        except asyncio.TimeoutError:
-            logger.error("Timeout lors de l'appel au pipeline TTS (retry).")
-            raise HTTPException(status_code=504, detail="Génération TTS trop longue (timeout).")
-        except Exception as e_inner:
-            logger.exception("Échec génération TTS après tentative: %s", e_inner)
-            raise HTTPException(status_code=500, detail="Erreur interne lors de la génération TTS.")
-
-    # 5) construire URL de téléchargement (relatif)
-    download_url = f"/download/{filename}"
-    response = {
-        "success": True,
-        "message": "Audio généré avec succès.",
-        "data": {
-            "filename": filename,
-            "download_url": download_url
-        }
-    }
-    return response
+            yield wav_stream_header(AUDIO_SR)
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks_q.get(), timeout=PIPELINE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    logger.error("Timeout lors de l'appel au pipeline TTS (stream, >%d s)", PIPELINE_TIMEOUT)
+                    break
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            # client déconnecté ou timeout: on arrête le pipeline au prochain chunk
+            stop.set()
+
+    return StreamingResponse(generate(), media_type="audio/wav")
 
 # <-- MODIFIÉ : Endpoint /download corrigé -->
 @app.get("/download/{filename}", response_class=FileResponse)
-def download_file(filename: str, background_tasks: BackgroundTasks):
-    # sanitation simple: s'assurer que le nom est dans le dossier static
+async def download_file(filename: str):
+    # sanitation: seuls les noms produits par safe_filename, dans le dossier static
+    if not _SAFE_RE.fullmatch(filename):
+        logger.warning("Nom de fichier refusé: %r", filename)
+        raise HTTPException(status_code=400, detail="Nom de fichier invalide.")
+    # vérification purement lexicale (pas d'appel système sur la boucle)
     safe_path = STATIC_DIR / filename
-    if not safe_path.exists():
+    if safe_path.parent != STATIC_DIR:
+        raise HTTPException(status_code=400, detail="Nom de fichier invalide.")
+    # un seul stat, hors de la boucle; réutilisé par FileResponse (pas de second stat)
+    try:
+        stat_result = await asyncio.to_thread(os.stat, safe_path)
+    except OSError:
+        stat_result = None
+    if stat_result is None or not stat.S_ISREG(stat_result.st_mode):
         logger.warning("Téléchargement demandé pour fichier inexistant: %s", filename)
         raise HTTPException(status_code=404, detail="Fichier non trouvé.")
     
     # On planifie la suppression du fichier APRES un délai,
     # pour laisser le temps au client de le télécharger.
-    background_tasks.add_task(cleanup_file_delayed, safe_path, delay_seconds=FILE_CLEANUP_DELAY)
+    # Les fichiers en cache sont conservés (supprimés à l'éviction du cache).
+    if filename not in CACHED_FILES:
+        schedule_cleanup(safe_path, FILE_CLEANUP_DELAY)
     
     logger.info("Serving file %s", safe_path)
-    return FileResponse(path=str(safe_path), filename=filename, media_type="audio/wav")
\ No newline at end of file
+    return FileResponse(path=str(safe_path), filename=filename, media_type="audio/wav", stat_result=stat_result)
\ No newline at end of file